@@ -1,10 +1,36 @@
 #!/usr/bin/env python3
 
+import bisect
+import functools
+import importlib
+import itertools
 import subprocess
 import re
 import sys
+import threading
+import time
 import os
 import json
+import mmap
+
+# Below this many bytes to scan, scanning serially beats starting a process
+# pool, whose workers each have to start Python and load this script
+PARALLEL_SCAN_MIN_BYTES = 8 * 1024 * 1024
+
+# Files larger than this are skipped unless max_scan_bytes is configured
+DEFAULT_MAX_SCAN_BYTES = 2 * 1024 * 1024
+
+# Files with a NUL byte in this many leading bytes are treated as binary
+BINARY_CHECK_BYTES = 8192
+
+# Scan results of unchanged files are cached here when scanning the whole repo
+CACHE_DIR = os.path.expanduser("~/.cache/securegit")
+
+# Bump to invalidate cached results when the scanning logic changes
+CACHE_VERSION = 3
+
+# Cached results that have not been used for this long are evicted
+CACHE_MAX_AGE_SECONDS = 30 * 24 * 60 * 60
 
 
 def load_config():
@@ -14,10 +40,20 @@ def load_config():
   config_paths = [
       # Local repository config
       os.path.join(os.getcwd(), "securegit.json"),
+      # Config installed by install_hook_local.py
+      os.path.join(os.getcwd(), ".git", "securegit.json"),
       # Global user config
       os.path.expanduser("~/.config/securegit/securegit.json"),
   ]
 
+  # In worktrees and submodules .git is a file, and install_hook_local.py
+  # puts the config in the git directory whose hooks directory runs this hook
+  hooks_dir = os.path.dirname(os.path.abspath(__file__))
+  git_dir = os.path.dirname(hooks_dir)
+  if (os.path.basename(hooks_dir) == "hooks" and
+      os.path.isfile(os.path.join(git_dir, "HEAD"))):
+    config_paths.insert(2, os.path.join(git_dir, "securegit.json"))
+
   config_path = ""
   for path in config_paths:
     if os.path.exists(path):
@@ -32,31 +68,268 @@ def load_config():
   try:
     with open(config_path, 'r') as f:
       config = json.load(f)
-      return config
   except (json.JSONDecodeError, IOError) as e:
     print(f"⚠️ Error loading config file: {e}")
     sys.exit(1)
 
+  return config
+
+
+def _compile_regexes(patterns):
+  """Compile each regex, reporting and skipping invalid ones."""
+  compiled = []
+  for pattern in patterns:
+    try:
+      compiled.append(re.compile(pattern))
+    except re.error as re_err:
+      print(f"⚠️ Invalid regex pattern '{pattern}': {re_err}")
+  return compiled
+
+
+def _combine_regexes(patterns):
+  """
+  Compile the valid patterns into a single alternation.
+
+  Returns:
+      A list holding the combined regex, or the separately compiled patterns
+      if they cannot be combined
+  """
+  compiled = _compile_regexes(patterns)
+  if len(compiled) < 2:
+    return compiled
+  try:
+    return [re.compile("|".join(f"(?:{_scope_flags(r.pattern)})"
+                                for r in compiled))]
+  except re.error:
+    return compiled
+
+
+def _compile_config(config):
+  """Precompile the regexes and lookup tables used while scanning."""
+  import hashlib
+
+  patterns_compiled = compile_patterns(config.get("patterns", []))
+  pattern_set = compile_pattern_set(_pattern_sources(patterns_compiled))
+
+  # Cached scan results are only valid for the exact config and regex engine
+  # they came from
+  engine = "re" if pattern_set is None else "re2"
+  config["_digest"] = hashlib.sha256(
+      json.dumps([CACHE_VERSION, engine, config],
+                 sort_keys=True).encode()).hexdigest()
+
+  config["_patterns_compiled"] = patterns_compiled
+  config["_pattern_set"] = pattern_set
+  config["_valid_extensions"] = tuple(config.get("valid_extensions", []))
+  config["_prohibited_files_set"] = frozenset(
+      config.get("prohibited_files", []))
+  config["_prohibited_patterns_compiled"] = _combine_regexes(
+      config.get("prohibited_patterns", []))
+
+  allowlist = config.get("allowlist")
+  if allowlist:
+    allowlist["files"] = frozenset(allowlist.get("files", []))
+    allowlist["lines"] = frozenset(allowlist.get("lines", []))
+    # Every path is a prefix, and also a regex unless it is a plain string
+    paths = allowlist.get("paths", [])
+    allowlist["_paths_prefixes"] = tuple(paths)
+    allowlist["_paths_compiled"] = _combine_regexes(
+        [p for p in paths if re.escape(p) != p])
+    allowlist["_patterns_compiled"] = _compile_regexes(
+        allowlist.get("patterns", []))
+
+  return config
+
+
+def _git_paths(args):
+  """Run a git command that prints NUL-separated paths and return them."""
+  result = subprocess.run(["git", *args, "-z"], stdout=subprocess.PIPE)
+  return [os.fsdecode(f) for f in result.stdout.split(b"\0") if f]
+
+
+@functools.lru_cache(maxsize=None)
+def _optional_module(name):
+  """Import an optional dependency on first use, or return None if missing."""
+  try:
+    return importlib.import_module(name)
+  except ImportError:
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _open_repository():
+  """Open the current repository with pygit2, or return None if unavailable."""
+  pygit2 = _optional_module("pygit2")
+  if pygit2 is None:
+    return None
+  try:
+    return pygit2.Repository(os.getcwd())
+  except pygit2.GitError:
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _open_index():
+  """
+  Open the index being committed with pygit2.
+
+  git commit -a and git commit <paths> run the hook against a temporary index
+  named by GIT_INDEX_FILE, which pygit2 does not read on its own.
+
+  Returns:
+      A (repository, index) tuple, or None if pygit2 cannot be used
+  """
+  repo = _open_repository()
+  if repo is None:
+    return None
+
+  index_file = os.environ.get("GIT_INDEX_FILE")
+  if not index_file:
+    return repo, repo.index
+
+  pygit2 = _optional_module("pygit2")
+  try:
+    return repo, pygit2.Index(index_file)
+  except (pygit2.GitError, OSError):
+    return None
+
 
 def get_staged_files():
-  result = subprocess.run(
-      ["git", "diff", "--cached", "--name-only", "--diff-filter=ACM"],
-      stdout=subprocess.PIPE,
-      text=True,
-  )
-  files = result.stdout.strip().split("\n")
-  return [f for f in files if f]
+  opened = _open_index()
+  if opened is None:
+    return _git_paths(["diff", "--cached", "--name-only", "--diff-filter=ACMR"])
+  repo, index = opened
+
+  # Before the first commit every file in the index is staged
+  if repo.head_is_unborn:
+    return [entry.path for entry in index]
+
+  pygit2 = _optional_module("pygit2")
+  diff = repo.head.peel(pygit2.Tree).diff_to_index(index)
+  staged = (pygit2.GIT_DELTA_ADDED, pygit2.GIT_DELTA_COPIED,
+            pygit2.GIT_DELTA_MODIFIED)
+  return [d.new_file.path for d in diff.deltas if d.status in staged]
 
 
 def get_all_repo_files():
   """Get all files tracked by git in the repository."""
-  result = subprocess.run(
-      ["git", "ls-files"],
-      stdout=subprocess.PIPE,
-      text=True,
-  )
-  files = result.stdout.strip().split("\n")
-  return [f for f in files if f]
+  return _git_paths(["ls-files"])
+
+
+def get_clean_blob_ids():
+  """
+  Get the blob ids of tracked files whose working tree copy matches the index.
+
+  Returns:
+      A dict mapping file paths to hex blob ids
+  """
+  repo = _open_repository()
+  if repo is not None:
+    blob_ids = {entry.path: str(entry.id) for entry in repo.index}
+    modified = {delta.old_file.path for delta in repo.diff().deltas}
+  else:
+    # Each entry is "<mode> <blob id> <stage>\t<path>"
+    result = subprocess.run(["git", "ls-files", "-s", "-z"],
+                            stdout=subprocess.PIPE)
+    blob_ids = {}
+    for entry in result.stdout.split(b"\0"):
+      if not entry:
+        continue
+      info, path = entry.split(b"\t", 1)
+      _, blob_id, stage = info.split()
+      if stage == b"0":
+        blob_ids[os.fsdecode(path)] = blob_id.decode()
+    modified = set(_git_paths(["diff", "--name-only"]))
+
+  return {p: blob_id for p, blob_id in blob_ids.items() if p not in modified}
+
+
+def read_staged_blobs(files, max_bytes=None):
+  """
+  Read the staged version of each file from the git index.
+
+  The blobs are read in-process with pygit2 when it is installed, or through
+  a single git cat-file process otherwise.
+
+  Args:
+      files: Paths of the staged files
+      max_bytes: Size above which a blob is not read into memory (optional)
+
+  Yields:
+      (filepath, data, size) tuples. data is None if the blob could not be
+      read, in which case size is None too, or if it is larger than
+      max_bytes, in which case size is its size.
+  """
+  opened = _open_index()
+  if opened is not None:
+    repo, index = opened
+    pygit2 = _optional_module("pygit2")
+    for filepath in files:
+      if filepath not in index:
+        yield filepath, None, None
+        continue
+      oid = index[filepath].id
+      # The header gives the size without loading the blob
+      try:
+        object_type, size = repo.odb.read_header(oid)
+      except (KeyError, pygit2.GitError):
+        yield filepath, None, None
+        continue
+      if object_type != pygit2.GIT_OBJECT_BLOB:
+        yield filepath, None, None
+      elif max_bytes is not None and size > max_bytes:
+        yield filepath, None, size
+      else:
+        yield filepath, repo.get(oid).data, size
+    return
+
+  # cat-file reads one object name per line
+  requested = [f for f in files if "\n" not in f]
+
+  with subprocess.Popen(["git", "cat-file", "--batch"],
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE) as proc:
+
+    def write_requests():
+      try:
+        for filepath in requested:
+          proc.stdin.write(b":" + os.fsencode(filepath) + b"\n")
+        proc.stdin.close()
+      except OSError:
+        pass
+
+    # Send every request up front from a separate thread, so that git never
+    # blocks on a full pipe while the blobs are being consumed
+    writer = threading.Thread(target=write_requests, daemon=True)
+    writer.start()
+
+    for filepath in files:
+      if "\n" in filepath:
+        yield filepath, None, None
+        continue
+
+      # "<oid> <type> <size>" followed by the contents, or "<name> missing"
+      header = proc.stdout.readline().split()
+      if len(header) != 3 or not header[2].isdigit():
+        yield filepath, None, None
+        continue
+      size = int(header[2])
+      is_blob = header[1] == b"blob"
+      if is_blob and (max_bytes is None or size <= max_bytes):
+        data = proc.stdout.read(size)
+        proc.stdout.read(1)
+        yield filepath, data, size
+        continue
+
+      # Skip over anything else without holding it in memory
+      remaining = size + 1
+      while remaining:
+        chunk = proc.stdout.read(min(remaining, 1024 * 1024))
+        if not chunk:
+          break
+        remaining -= len(chunk)
+      yield filepath, None, size if is_blob else None
+    writer.join()
 
 
 def is_allowlisted(filepath, line_num=None, match_text=None, config=None):
@@ -72,30 +345,31 @@ def is_allowlisted(filepath, line_num=None, match_text=None, config=None):
   Returns:
       True if the item is allowlisted, False otherwise
   """
-  if not config or "allowlist" not in config:
+  allowlist = config.get("allowlist") if config else None
+  if not allowlist:
     return False
 
-  allowlist = config["allowlist"]
-
   # Check if the exact file is in the file allowlist
-  if filepath in allowlist.get("files", []):
+  if filepath in allowlist.get("files", ()):
     return True
 
   # Check if the file is in an allowlisted path
-  for path in allowlist.get("paths", []):
-    if filepath.startswith(path) or re.match(path, filepath):
+  if filepath.startswith(allowlist.get("_paths_prefixes", ())):
+    return True
+  for regex in allowlist.get("_paths_compiled", []):
+    if regex.match(filepath):
       return True
 
   # Check for specific line allowlist
   if line_num is not None:
     line_key = f"{filepath}:{line_num}"
-    if line_key in allowlist.get("lines", []):
+    if line_key in allowlist.get("lines", ()):
       return True
 
   # Check if the match text is in the patterns allowlist
   if match_text is not None:
-    for pattern in allowlist.get("patterns", []):
-      if re.search(pattern, match_text):
+    for regex in allowlist.get("_patterns_compiled", []):
+      if regex.search(match_text):
         return True
 
   return False
@@ -104,9 +378,9 @@ def is_allowlisted(filepath, line_num=None, match_text=None, config=None):
 def check_prohibited_files(files, config):
   prohibited_found = []
 
-  # Get lists from config with fallbacks to empty lists
-  prohibited_files = config.get("prohibited_files", [])
-  prohibited_patterns = config.get("prohibited_patterns", [])
+  # Get lookups from config with fallbacks to empty ones
+  prohibited_files = config.get("_prohibited_files_set", frozenset())
+  prohibited_patterns = config.get("_prohibited_patterns_compiled", [])
 
   for file in files:
     # Skip allowlisted files
@@ -120,56 +394,418 @@ def check_prohibited_files(files, config):
       continue
 
     # Check regex patterns
-    for pattern in prohibited_patterns:
-      if re.match(pattern, file):
+    for regex in prohibited_patterns:
+      if regex.match(file):
         prohibited_found.append((file, "File matches prohibited pattern"))
         break
 
   return prohibited_found
 
 
-def scan_file(filepath, config):
-  findings = []
+def _scope_flags(pattern):
+  """Turn the leading inline flags of a pattern into a scoped group."""
+  # Inline global flags are only valid at the very start of a regex, so they
+  # must be scoped before the pattern is combined with others.
+  flags = re.match(r"\(\?([aiLmsux]+)\)", pattern)
+  if flags:
+    return f"(?{flags.group(1)}:{pattern[flags.end():]})"
+  return pattern
+
+
+def compile_patterns(patterns):
+  """
+  Compile each secret pattern for scanning whole files.
+
+  The patterns are kept separate because re can only search for the literal
+  prefix of a pattern on its own, which makes a fused alternation several
+  times slower than one pass per pattern. They are compiled in multiline mode
+  so that ^ and $ still anchor at line boundaries. Invalid patterns are
+  reported and skipped.
+
+  Returns:
+      A list of compiled bytes regexes
+  """
+  compiled = []
+  for pattern in patterns:
+    try:
+      compiled.append(re.compile(pattern.encode(), re.MULTILINE))
+    except re.error as re_err:
+      print(f"⚠️ Invalid regex pattern '{pattern}': {re_err}")
+  return compiled
+
+
+def _pattern_sources(compiled):
+  """Return the source of each compiled bytes regex as a string."""
+  return [regex.pattern.decode() for regex in compiled]
+
+
+def compile_pattern_set(patterns):
+  """
+  Build an RE2 set of the secret patterns if google-re2 is installed.
+
+  The set tells in one linear-time pass which patterns match a file, so only
+  those are run with re and files without secrets are not scanned at all.
+
+  Returns:
+      A compiled re2.Set whose ids are the indices of patterns, or None if RE2
+      is unavailable or rejects a pattern
+  """
+  re2 = _optional_module("re2")
+  if re2 is None:
+    return None
+
+  options = re2.Options()
+  options.max_mem = 64 << 20
+  # Files are scanned as raw bytes like with re, and as UTF-8 RE2 would not
+  # match . or negated classes across bytes that are not valid UTF-8
+  options.encoding = re2.Options.Encoding.LATIN1
+  pattern_set = re2.Set.SearchSet(options)
   try:
-    with open(filepath, "r", encoding="utf-8") as file:
-      content = file.read()
-      line_num = 1
+    for pattern in patterns:
+      # Match ^ and $ at line boundaries, like the patterns compiled with re,
+      # and match the same UTF-8 bytes that re does for non-ASCII literals
+      pattern_set.Add(b"(?m)" + pattern.encode())
+    pattern_set.Compile()
+  except re2.error:
+    return None
+  return pattern_set
+
+
+def newline_offsets(data):
+  """Return the offsets of every newline in data, in ascending order."""
+  numpy = _optional_module("numpy")
+  if numpy is not None:
+    return numpy.flatnonzero(
+        numpy.frombuffer(data, dtype=numpy.uint8) == ord("\n")).tolist()
+  return [m.start() for m in re.finditer(b"\n", data)]
+
+
+def _skip_scan(filepath, size, head, config):
+  """Check whether a file is too large or binary to be scanned."""
+  max_scan_bytes = config.get("max_scan_bytes", DEFAULT_MAX_SCAN_BYTES)
+  if size > max_scan_bytes:
+    print(f"⚠️ Skipping {filepath}: larger than {max_scan_bytes} bytes")
+    return True
+
+  # Skip binary files, using the same NUL byte heuristic as git
+  return b"\0" in head[:BINARY_CHECK_BYTES]
 
-      # Check if the entire file is allowlisted
-      if is_allowlisted(filepath, config=config):
+
+def scan_file(filepath, config, data=None, size=None):
+  """
+  Scan a file for hardcoded secrets.
+
+  Args:
+      filepath: Path to the file being checked
+      config: Configuration dictionary
+      data: Contents of the file (optional, read from disk if not given)
+      size: Size of a staged blob that was too large to be read (optional)
+
+  Returns:
+      A list of (line_num, match_value) tuples, or None if the file could not
+      be read
+  """
+  # Check if the entire file is allowlisted
+  if is_allowlisted(filepath, config=config):
+    return []
+
+  if data is not None:
+    if _skip_scan(filepath, len(data), data, config):
+      return []
+    return _scan_data(filepath, data, config)
+  if size is not None:
+    _skip_scan(filepath, size, b"", config)
+    return []
+
+  try:
+    with open(filepath, "rb") as file:
+      head = file.read(BINARY_CHECK_BYTES)
+      if _skip_scan(filepath, os.fstat(file.fileno()).st_size, head, config):
         return []
 
-      # Get patterns from config with fallback to empty list
-      patterns = config.get("patterns", [])
-
-      for line in content.split("\n"):
-        # Skip allowlisted specific lines
-        if is_allowlisted(filepath, line_num, config=config):
-          line_num += 1
-          continue
-
-        for pattern in patterns:
-          try:
-            matches = re.findall(pattern, line)
-            if matches:
-              for match in matches:
-                # If the match is a tuple (from capture groups), take the first element
-                match_value = match[0] if isinstance(match, tuple) else match
-
-                # Skip allowlisted patterns
-                if is_allowlisted(filepath, line_num, match_value, config):
-                  continue
-
-                findings.append((line_num, match_value))
-          except re.error as re_err:
-            print(f"⚠️ Invalid regex pattern '{pattern}': {re_err}")
-        line_num += 1
+      # Map larger files instead of copying them into memory. Smaller files
+      # have already been read whole, and mmap rejects empty files anyway.
+      if len(head) < BINARY_CHECK_BYTES:
+        data = head
+      else:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
   except Exception as e:
     print(f"⚠️ Could not read {filepath}: {e}")
-  return findings
+    return None
+
+  try:
+    return _scan_data(filepath, data, config)
+  finally:
+    if isinstance(data, mmap.mmap):
+      data.close()
+
+
+def _allowlisted_lines(filepath, allowlist):
+  """Return the line numbers allowlisted for a file as "<filepath>:<line>"."""
+  prefix = f"{filepath}:"
+  return {
+      int(key[len(prefix):])
+      for key in allowlist.get("lines", ())
+      if key.startswith(prefix) and key[len(prefix):].isdecimal()
+  }
+
+
+def _line_matches(regex, data):
+  """
+  Find the matches of a regex in data that lie within a single line.
+
+  Patterns such as \\s can match a newline when run over a whole file, so a
+  match that runs past the end of its line is searched for again within that
+  line alone.
+
+  Yields:
+      Match objects in order of their start offset
+  """
+  pos = 0
+  while True:
+    match = regex.search(data, pos)
+    if match is None:
+      return
+
+    start, end = match.span()
+    line_end = data.find(b"\n", start, end)
+    if line_end == -1:
+      yield match
+      pos = end if end > start else start + 1
+      continue
+
+    line_start = data.rfind(b"\n", 0, start) + 1
+    yield from regex.finditer(data, max(pos, line_start), line_end)
+    pos = line_end + 1
+
+
+def _scan_data(filepath, data, config):
+  """Scan the contents of a file for patterns that are not allowlisted."""
+  # Let RE2 pick out the patterns that match somewhere in the file, so only
+  # those are searched for line by line
+  regexes = config["_patterns_compiled"]
+  pattern_set = config.get("_pattern_set")
+  if pattern_set is not None:
+    matched = pattern_set.Match(data)
+    if not matched:
+      return []
+    regexes = [regexes[i] for i in sorted(matched)]
+
+  # The file itself is not allowlisted, so only lines and match text can be
+  allowlist = config.get("allowlist") or {}
+  allowlisted_patterns = allowlist.get("_patterns_compiled", [])
+
+  findings = []
+  newlines = None
+  for regex in regexes:
+    for match in _line_matches(regex, data):
+      # Only index newlines and allowlisted lines once a file has a match
+      if newlines is None:
+        newlines = newline_offsets(data)
+        allowlisted_lines = _allowlisted_lines(filepath, allowlist)
+
+      line_num = bisect.bisect_left(newlines, match.start()) + 1
+      if line_num in allowlisted_lines:
+        continue
+
+      match_value = match.group().decode("utf-8", "replace")
+      if any(p.search(match_value) for p in allowlisted_patterns):
+        continue
+
+      findings.append((line_num, match_value))
+
+  # Overlapping patterns can report the same secret more than once, and each
+  # pattern makes its own pass, so restore the order of the file
+  return sorted(dict.fromkeys(findings), key=lambda finding: finding[0])
+
+
+_WORKER_CONFIG = None
+
+
+def _init_worker(config):
+  """Install the scan configuration in a worker process."""
+  global _WORKER_CONFIG
+  # RE2 sets cannot be pickled, so each worker builds its own
+  config["_pattern_set"] = compile_pattern_set(
+      _pattern_sources(config["_patterns_compiled"]))
+  _WORKER_CONFIG = config
+
+
+def _scan_file_worker(item):
+  filepath, data, size = item
+  return scan_file(filepath, _WORKER_CONFIG, data, size)
+
+
+def _scan_size(filepath, data, size, config):
+  """Estimate how many bytes scanning a file will go through."""
+  if data is not None:
+    size = len(data)
+  elif size is None:
+    try:
+      size = os.stat(filepath).st_size
+    except OSError:
+      size = 0
+  # Files over the limit are skipped without being scanned
+  max_scan_bytes = config.get("max_scan_bytes", DEFAULT_MAX_SCAN_BYTES)
+  return size if size <= max_scan_bytes else 0
+
+
+def scan_files(files, config, staged=False):
+  """
+  Scan files for secrets, using a process pool when there is a lot to scan.
+
+  Args:
+      files: Paths of the files to scan
+      config: Configuration dictionary
+      staged: Scan the staged version of the files instead of the working tree
+
+  Returns:
+      A list of (filepath, findings) tuples in the order of files
+  """
+  if staged:
+    contents = read_staged_blobs(
+        files, config.get("max_scan_bytes", DEFAULT_MAX_SCAN_BYTES))
+  else:
+    contents = ((file, None, None) for file in files)
+
+  if (os.cpu_count() or 1) < 2:
+    return [(file, scan_file(file, config, data, size))
+            for file, data, size in contents]
+
+  # Only start the pool once enough has been read to pay for it
+  buffered = []
+  total_bytes = 0
+  for item in contents:
+    buffered.append(item)
+    total_bytes += _scan_size(*item, config)
+    if total_bytes >= PARALLEL_SCAN_MIN_BYTES:
+      break
+  else:
+    return [(file, scan_file(file, config, data, size))
+            for file, data, size in buffered]
+
+  import concurrent.futures
+  import multiprocessing
+
+  # Forked workers would inherit the cat-file pipe and keep git from ever
+  # seeing EOF, so start them from a clean fork server where available
+  if "forkserver" in multiprocessing.get_all_start_methods():
+    context = multiprocessing.get_context("forkserver")
+  else:
+    context = multiprocessing.get_context()
+
+  # Files are handed to the workers as soon as they are read, so reading
+  # blobs from git overlaps with scanning them
+  worker_config = dict(config, _pattern_set=None)
+  with concurrent.futures.ProcessPoolExecutor(
+      mp_context=context, initializer=_init_worker,
+      initargs=(worker_config,)) as executor:
+    return list(zip(files, executor.map(_scan_file_worker,
+                                        itertools.chain(buffered, contents),
+                                        chunksize=8)))
+
+
+def _open_cache():
+  """Open the scan result cache, or return None if it cannot be used."""
+  import sqlite3
+
+  cache_path = os.path.join(CACHE_DIR, "results.sqlite")
+  try:
+    # The cache names files in private repositories, so keep it to the user
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    os.close(os.open(cache_path, os.O_RDWR | os.O_CREAT, 0o600))
+    cache = sqlite3.connect(cache_path)
+    # Start over when the cache was written by a different version. Older
+    # versions stored the text of findings, so overwrite it on disk too.
+    if cache.execute("PRAGMA user_version").fetchone()[0] != CACHE_VERSION:
+      os.chmod(CACHE_DIR, 0o700)
+      os.chmod(cache_path, 0o600)
+      cache.execute("PRAGMA secure_delete = ON")
+      with cache:
+        cache.execute("DROP TABLE IF EXISTS results")
+        cache.execute("CREATE TABLE results ("
+                      "blob TEXT, path TEXT, config TEXT, used INTEGER, "
+                      "PRIMARY KEY (blob, path, config))")
+        cache.execute("CREATE INDEX results_used ON results (used)")
+        cache.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+      cache.execute("VACUUM")
+  except (OSError, sqlite3.Error) as e:
+    print(f"⚠️ Could not open scan cache: {e}")
+    return None
+  return cache
+
+
+def scan_repo_files(files, config):
+  """
+  Scan tracked files in the working tree, skipping unchanged clean ones.
+
+  Files found to be clean are cached by blob id, path and config, so they are
+  only scanned again when their content, their allowlisting or the
+  configuration changes. Files with findings are not cached, so that no
+  secret is ever copied out of the repository, and neither are files with
+  uncommitted changes in the working tree. Entries left unused for
+  CACHE_MAX_AGE_SECONDS, such as those of an old configuration, are evicted.
+
+  Returns:
+      A list of (filepath, findings) tuples in the order of files
+  """
+  import sqlite3
+
+  cache = _open_cache()
+  if cache is None:
+    return scan_files(files, config)
+
+  digest = config["_digest"]
+  now = int(time.time())
+  blob_ids = get_clean_blob_ids()
+
+  # Look up each file on its own, so that only the rows for this repository
+  # are read rather than everything cached under the same config
+  results = {}
+  hits = []
+  try:
+    for file in files:
+      blob_id = blob_ids.get(file)
+      if blob_id is None:
+        continue
+      row = cache.execute(
+          "SELECT 1 FROM results WHERE blob = ? AND path = ? AND config = ?",
+          (blob_id, file, digest)).fetchone()
+      if row is not None:
+        results[file] = []
+        hits.append((now, blob_id, file, digest))
+  except sqlite3.Error as e:
+    print(f"⚠️ Could not read scan cache: {e}")
+
+  missing = [file for file in files if file not in results]
+  new_rows = []
+  for file, findings in scan_files(missing, config):
+    results[file] = findings
+    # Unreadable files and files with findings are scanned again next time
+    if file in blob_ids and findings == []:
+      new_rows.append((blob_ids[file], file, digest, now))
+
+  try:
+    with cache:
+      cache.executemany(
+          "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", new_rows)
+      cache.executemany(
+          "UPDATE results SET used = ? "
+          "WHERE blob = ? AND path = ? AND config = ?", hits)
+      cache.execute("DELETE FROM results WHERE used < ?",
+                    (now - CACHE_MAX_AGE_SECONDS,))
+  except sqlite3.Error as e:
+    print(f"⚠️ Could not update scan cache: {e}")
+  cache.close()
+
+  return [(file, results[file]) for file in files]
 
 
 def main():
+  # Replace anything the terminal cannot encode, such as undecodable bytes
+  # in paths, rather than crashing halfway through the report
+  sys.stdout.reconfigure(errors="replace")
+
   # Load configuration
   config = load_config()
 
@@ -178,7 +814,8 @@ def main():
     print("✅ SecureGit-Hook is disabled in configuration. Skipping checks.")
     sys.exit(0)
 
-  if "scan_entire_repo" in config and config["scan_entire_repo"]:
+  scan_entire_repo = config.get("scan_entire_repo", False)
+  if scan_entire_repo:
     files = get_all_repo_files()
     print("🔍 Scanning entire repository as configured...")
   else:
@@ -188,6 +825,9 @@ def main():
     print("✅ No relevant files staged.")
     return
 
+  # Only pay for compiling the config once there is something to check
+  config = _compile_config(config)
+
   print(f"🔍 Scanning {len(files)} file(s)...")
 
   # First check for prohibited files
@@ -200,15 +840,17 @@ def main():
     sys.exit(1)
 
   # Filter for valid extensions for secret scanning
-  valid_extensions = config.get("valid_extensions", [])
-  files_to_scan = [
-      f for f in files if any(f.endswith(ext) for ext in valid_extensions)
-  ]
+  valid_extensions = config.get("_valid_extensions", ())
+  files_to_scan = [f for f in files if f.endswith(valid_extensions)]
 
   any_findings = False
 
-  for file in files_to_scan:
-    matches = scan_file(file, config)
+  if scan_entire_repo:
+    results = scan_repo_files(files_to_scan, config)
+  else:
+    # Scan what is about to be committed, not the working tree
+    results = scan_files(files_to_scan, config, staged=True)
+  for file, matches in results:
     if matches:
       any_findings = True
       print(f"\n❌ Hardcoded secrets found in {file}:")
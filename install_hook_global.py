@@ -1,14 +1,44 @@
 #!/usr/bin/env python3
 
 import os
-import shutil
 import subprocess
-import datetime
+import time
 
 PYTHON_SCRIPT = "check_secrets.py"
 CONFIG_FILE = "securegit.json"
 
 
+def _read_file(path):
+  """Read the whole of a file in one go."""
+  with open(path, "rb", buffering=0) as f:
+    return f.read()
+
+
+def _write_file(path, data, mode=None):
+  """
+  Write data to a file, replacing its contents.
+
+  Args:
+      path: Path of the file to write
+      data: Bytes to write
+      mode: Permission bits to give the file, or None to keep the default
+  """
+  fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+  try:
+    # Set the mode on the open descriptor rather than looking up the path
+    # again
+    if mode is not None:
+      if hasattr(os, "fchmod"):
+        os.fchmod(fd, mode)
+      else:
+        os.chmod(path, mode)
+    view = memoryview(data)
+    while view:
+      view = view[os.write(fd, view):]
+  finally:
+    os.close(fd)
+
+
 def main():
   template_hooks_dir = os.path.expanduser("~/.git-templates/hooks")
   destination_hook = os.path.join(template_hooks_dir, "pre-commit")
@@ -23,6 +53,9 @@ def main():
     print(f"❌ Cannot find {CONFIG_FILE}. Please make sure it exists.")
     return
 
+  script = _read_file(PYTHON_SCRIPT)
+  config = _read_file(CONFIG_FILE)
+
   os.makedirs(template_hooks_dir, exist_ok=True)
   print(
       f"📂 Ensured git template hooks directory exists at {template_hooks_dir}")
@@ -31,11 +64,7 @@ def main():
   print(f"📂 Ensure global config directory exists at {global_config_path}")
 
   if os.path.exists(destination_hook):
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    backup_path = f"{destination_hook}.bak.{timestamp}"
-    shutil.copyfile(destination_hook, backup_path)
-
-    print(f"⚠️ Existing pre-commit hook found and backed up to: {backup_path}")
+    print("⚠️ Existing pre-commit hook found.")
     print("⚠️ Installing this hook will replace your existing global pre-commit hook.")
 
     response = input("Do you want to continue? (y/N): ").strip().lower()
@@ -43,15 +72,19 @@ def main():
       print("❌ Installation aborted.")
       return
 
-  shutil.copyfile(PYTHON_SCRIPT, destination_hook)
-  os.chmod(destination_hook, 0o775)
+    # Moving the old hook aside is a rename, so its data is never copied
+    backup_path = f"{destination_hook}.bak.{time.strftime('%Y%m%d%H%M%S')}"
+    os.replace(destination_hook, backup_path)
+    print(f"⚠️ Existing pre-commit hook backed up to: {backup_path}")
+
+  _write_file(destination_hook, script, mode=0o775)
   print(f"✅ Copied pre-commit hook to {destination_hook}")
 
   subprocess.run(["git", "config", "--global", "init.templateDir",
                  os.path.expanduser("~/.git-templates")], check=True)
   print("🔧 Set git global init.templateDir to ~/.git-templates")
 
-  shutil.copyfile(CONFIG_FILE, global_config_file)
+  _write_file(global_config_file, config)
   print(f"✅ Copied config file to {global_config_file}")
 
   print("\n🚀 All set! Now every time you run 'git init', your pre-commit hook will be auto-installed.")
@@ -1,36 +1,118 @@
 #!/usr/bin/env python3
 
 import os
-import shutil
-import datetime
+import time
 
 PYTHON_SCRIPT = "check_secrets.py"
 CONFIG_FILE = "securegit.json"
 
 
-def main():
-  git_dir = os.path.join(".git", "hooks")
-  hook_path = os.path.join(git_dir, "pre-commit")
-  config_path = os.path.join(".git", "securegit.json")
+def _list_dir(path):
+  """Map the names in a directory to their entries, or return None."""
+  try:
+    with os.scandir(path) as entries:
+      return {entry.name: entry for entry in entries}
+  except OSError:
+    return None
+
+
+def _find_git_dir(cwd):
+  """
+  Find the git directory that holds the hooks of the current repository.
+
+  In linked worktrees and submodules .git is a file naming the real git
+  directory, and a worktree shares the hooks of its main repository through
+  the commondir file.
+
+  Args:
+      cwd: Entries of the current directory, as returned by _list_dir, or
+          None if it could not be listed
+
+  Returns:
+      The path of the git directory, or None if this is not a repository
+  """
+  entry = cwd.get(".git") if cwd is not None else None
+  if entry is None:
+    return None
+  if entry.is_dir():
+    return ".git"
+
+  try:
+    with open(".git", encoding="utf-8") as f:
+      line = f.readline()
+  except (OSError, UnicodeDecodeError):
+    return None
+  if not line.startswith("gitdir:"):
+    return None
+
+  # Relative paths are relative to the directory holding the file, and
+  # joining an absolute path keeps it as is
+  git_dir = os.path.join(".", line[len("gitdir:"):].strip())
+  try:
+    with open(os.path.join(git_dir, "commondir"), encoding="utf-8") as f:
+      git_dir = os.path.join(git_dir, f.readline().strip())
+  except (OSError, UnicodeDecodeError):
+    pass
+  return os.path.normpath(git_dir)
+
 
-  if not os.path.isdir(git_dir):
+def _read_file(path):
+  """Read the whole of a file in one go."""
+  with open(path, "rb", buffering=0) as f:
+    return f.read()
+
+
+def _write_file(path, data, mode=None):
+  """
+  Write data to a file, replacing its contents.
+
+  Args:
+      path: Path of the file to write
+      data: Bytes to write
+      mode: Permission bits to give the file, or None to keep the default
+  """
+  fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+  try:
+    # Set the mode on the open descriptor rather than looking up the path
+    # again
+    if mode is not None:
+      if hasattr(os, "fchmod"):
+        os.fchmod(fd, mode)
+      else:
+        os.chmod(path, mode)
+    view = memoryview(data)
+    while view:
+      view = view[os.write(fd, view):]
+  finally:
+    os.close(fd)
+
+
+def main():
+  # Listing the directories answers every existence check without a stat
+  cwd = _list_dir(".")
+  git_dir = _find_git_dir(cwd)
+  hooks_dir = os.path.join(git_dir, "hooks") if git_dir else None
+  hooks = _list_dir(hooks_dir) if hooks_dir else None
+  if hooks is None:
     print("❌ Not a git repository!")
     return
 
-  if not os.path.exists(PYTHON_SCRIPT):
+  hook_path = os.path.join(hooks_dir, "pre-commit")
+  config_path = os.path.join(git_dir, "securegit.json")
+
+  if PYTHON_SCRIPT not in cwd:
     print(f"❌ Cannot find {PYTHON_SCRIPT}. Please make sure it exists.")
     return
 
-  if not os.path.exists(CONFIG_FILE):
+  if CONFIG_FILE not in cwd:
     print(f"❌ Cannot find {CONFIG_FILE}. Please make sure it exists.")
     return
 
-  if os.path.exists(hook_path):
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    backup_path = f"{hook_path}.bak.{timestamp}"
-    shutil.copyfile(hook_path, backup_path)
+  script = _read_file(PYTHON_SCRIPT)
+  config = _read_file(CONFIG_FILE)
 
-    print(f"⚠️ Existing pre-commit hook found and backed up to: {backup_path}")
+  if "pre-commit" in hooks:
+    print("⚠️ Existing pre-commit hook found.")
     print("⚠️ Installing this hook will replace your existing pre-commit hook.")
 
     response = input("Do you want to continue? (y/N): ").strip().lower()
@@ -38,10 +120,14 @@ def main():
       print("❌ Installation aborted.")
       return
 
-  shutil.copyfile("check_secrets.py", hook_path)
-  os.chmod(hook_path, 0o775)
+    # Moving the old hook aside is a rename, so its data is never copied
+    backup_path = f"{hook_path}.bak.{time.strftime('%Y%m%d%H%M%S')}"
+    os.replace(hook_path, backup_path)
+    print(f"⚠️ Existing pre-commit hook backed up to: {backup_path}")
+
+  _write_file(hook_path, script, mode=0o775)
 
-  shutil.copyfile("securegit.json", config_path)
+  _write_file(config_path, config)
 
   print("✅ Pre-commit hook and configuration installed successfully!")
 